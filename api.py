@@ -1,21 +1,48 @@
-import json
 import logging
-from typing import List, Dict, Any
-from fastapi import FastAPI, HTTPException, Body
+import os
+import sys
+from typing import List, Dict, Any, Optional
+import orjson
+import ormsgpack
+import structlog
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Minimum log level, configurable through the LOG_LEVEL environment variable
+_LOG_LEVEL = logging.getLevelNamesMapping().get(os.environ.get("LOG_LEVEL", "WARNING").upper(), logging.WARNING)
+
+# Configure logging: structured JSON records rendered with orjson
+structlog.configure(
+    processors=[
+        structlog.processors.add_log_level,
+        structlog.processors.TimeStamper(fmt="iso", utc=True),
+        structlog.processors.format_exc_info,
+        structlog.processors.JSONRenderer(serializer=orjson.dumps),
+    ],
+    wrapper_class=structlog.make_filtering_bound_logger(_LOG_LEVEL),
+    logger_factory=structlog.BytesLoggerFactory(),
+    cache_logger_on_first_use=True,
 )
-logger = logging.getLogger(__name__)
+# BytesLoggerFactory ignores logger names, so bind it as a field instead
+logger = structlog.get_logger().bind(logger=__name__)
+
+# Precomputed output keys for sequential phone numbers; formatting is only
+# needed for the rare property with more unique phones than this covers
+_PHONE_KEYS = tuple(sys.intern(f'phone_{i}') for i in range(32))
+
+# Properties usually have only a handful of phones, where a list membership
+# check beats building a set; past this size dedup switches to a set
+_SMALL_PHONE_COUNT = 16
 
 # Create FastAPI app
 app = FastAPI(
     title="Property Data Transformer API",
     description="API for transforming property data with sequential phone numbers",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -27,20 +54,215 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.post("/transform")
-async def transform_property_data(data: Dict[str, Any] = Body(...)):
+# Compress large responses; the repeated property keys compress well and a
+# low compression level keeps the CPU cost small
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+class PropertyOut(BaseModel):
+    """
+    Documented shape of a transformed property. Used for the OpenAPI schema
+    only; responses are serialized directly without validating against it.
+    Sequential phone_0..phone_N fields are carried as extra fields.
+    """
+    model_config = ConfigDict(extra='allow')
+
+    property_id: Optional[str] = None
+    address: Optional[str] = None
+    address_street: Optional[str] = None
+    address_street2: Optional[str] = None
+    address_city: Optional[str] = None
+    address_state: Optional[str] = None
+    address_zip: Optional[str] = None
+    address_range: Optional[str] = None
+    owner_name: Optional[str] = None
+    first_contact_name: Optional[str] = None
+    bedrooms: Optional[Any] = None
+    baths: Optional[Any] = None
+    sqft: Optional[Any] = None
+    estimated_value: Optional[Any] = None
+    equity_percent: Optional[Any] = None
+    last_sale_date: Optional[str] = None
+    last_sale_price: Optional[Any] = None
+    flags: List[str] = []
+
+def _accepts_msgpack(accept: str) -> bool:
+    """
+    Check whether an Accept header explicitly allows application/msgpack.
+
+    A q-value of 0 marks the type as not acceptable.
+    """
+    for media_range in accept.split(','):
+        media_type, *params = media_range.split(';')
+        if media_type.strip().lower() != 'application/msgpack':
+            continue
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+def _transform_one(property_data: Dict[str, Any], debug_enabled: bool = False) -> Dict[str, Any]:
+    """
+    Transform a single raw property record into a flat property dict.
+
+    Args:
+        property_data: Raw property record from the Deal Machine payload
+        debug_enabled: Whether per-property debug logging should be emitted
+
+    Returns:
+        Transformed property data with sequential phone numbers
+    """
+    g = property_data.get
+    if debug_enabled:
+        logger.debug("Processing property", property_id=g('property_id'))
+    # --- Basic Property Info ---
+    prop_info = {
+        "property_id": g('property_id'),
+        "address": g('property_address_full'),
+        "address_street": g('property_address'),
+        "address_street2": g('property_address2'),
+        "address_city": g('property_address_city'),
+        "address_state": g('property_address_state'),
+        "address_zip": g('property_address_zip'),
+        "address_range": g('property_address_range'),
+        "owner_name": g('owner_name'),
+        "first_contact_name": None,
+        "bedrooms": g('total_bedrooms'),
+        "baths": g('total_baths'),
+        "sqft": g('building_square_feet'),
+        "estimated_value": g('EstimatedValue'),
+        "equity_percent": g('equity_percent'),
+        "last_sale_date": g('sale_date'),
+        "last_sale_price": g('saleprice'),
+        "flags": [label for label in (flag.get('label') for flag in g('property_flags') or () if isinstance(flag, dict)) if label],
+    }
+
+    # --- Process Phone Numbers and Find First Contact Name ---
+    unique_phones_for_property = []
+    seen_phones = None
+    phones_append = unique_phones_for_property.append
+    first_contact_found = False
+
+    # The list itself is checked once; make.com always sends dicts inside it,
+    # so malformed entries are handled as exceptions rather than type-checked
+    # on every iteration
+    phone_numbers_list = g('phone_numbers')
+    if not isinstance(phone_numbers_list, list):
+        phone_numbers_list = ()
+    if debug_enabled:
+        logger.debug("Processing phone numbers", property_id=g('property_id'), count=len(phone_numbers_list))
+    for phone_entry in phone_numbers_list:
+        try:
+            contact_data = phone_entry.get('contact')
+        except AttributeError:
+            logger.warning("Skipping invalid phone entry", entry_type=type(phone_entry).__name__)
+            continue
+
+        if not contact_data:
+            continue
+        try:
+            cget = contact_data.get
+        except AttributeError:
+            continue
+
+        if not first_contact_found:
+            full_name = cget('full_name')
+            if full_name:
+                prop_info["first_contact_name"] = full_name
+                first_contact_found = True
+                if debug_enabled:
+                    logger.debug("Found first contact name", full_name=full_name)
+
+        for phone in (cget('phone_1'), cget('phone_2'), cget('phone_3')):
+            if not phone:
+                continue
+            if seen_phones is None:
+                if phone not in unique_phones_for_property:
+                    phones_append(phone)
+                    if len(unique_phones_for_property) > _SMALL_PHONE_COUNT:
+                        seen_phones = set(unique_phones_for_property)
+            elif phone not in seen_phones:
+                seen_phones.add(phone)
+                phones_append(phone)
+
+    unique_phones_for_property.sort()
+    if debug_enabled:
+        logger.debug("Found unique phone numbers", property_id=g('property_id'), count=len(unique_phones_for_property))
+
+    for i, phone in enumerate(unique_phones_for_property):
+        prop_info[_PHONE_KEYS[i] if i < len(_PHONE_KEYS) else f'phone_{i}'] = phone
+
+    return prop_info
+
+def _transform_one_safe(property_data: Dict[str, Any], debug_enabled: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Transform a single property, logging and returning None on failure.
+    """
+    try:
+        return _transform_one(property_data, debug_enabled)
+    except Exception as prop_error:
+        logger.error("Error processing property", property_id=property_data.get('property_id'), error=str(prop_error), exc_info=True)
+        return None  # Skip this property and continue with others
+
+def transform_properties(properties_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Transform a list of raw property records into flat property dicts.
+
+    Kept free of any FastAPI/request state so it can be profiled and reused
+    on its own.
+
+    Args:
+        properties_list: Raw property records from the Deal Machine payload
+
+    Returns:
+        List of transformed property data with sequential phone numbers
+    """
+    debug_enabled = logger.is_enabled_for(logging.DEBUG)
+    return [
+        prop_info
+        for prop_info in (_transform_one_safe(p, debug_enabled) for p in properties_list)
+        if prop_info is not None
+    ]
+
+@app.post(
+    "/transform",
+    response_model=None,
+    responses={200: {"model": List[PropertyOut]}},
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": {"type": "object"}}}
+        }
+    }
+)
+async def transform_property_data(request: Request):
     """
     Transform property data by extracting basic info and creating sequentially numbered phone numbers.
     
+    The JSON body (raw data from make.com HTTP module) is read and parsed
+    with orjson directly rather than through a FastAPI body parameter, which
+    skips FastAPI's body validation and lets string (IMTBuffer) bodies through.
+    
     Args:
-        data: Raw data from make.com HTTP module
+        request: Incoming request carrying the make.com payload; also used
+            to negotiate the response format
         
     Returns:
-        List of transformed property data with sequential phone numbers
+        List of transformed property data with sequential phone numbers, as
+        JSON or as MessagePack when requested with Accept: application/msgpack
     """
     try:
-        logger.info(f"Received request with data type: {type(data)}")
-        logger.info(f"Raw data content: {data}")
+        try:
+            data = orjson.loads(await request.body())
+        except orjson.JSONDecodeError as e:
+            logger.error("Error parsing request body", error=str(e))
+            raise HTTPException(status_code=400, detail=f"Invalid JSON data: {str(e)}")
+
+        logger.info("Received request", data_type=type(data).__name__)
         
         # Handle raw string data from make.com
         if isinstance(data, str):
@@ -48,53 +270,42 @@ async def transform_property_data(data: Dict[str, Any] = Body(...)):
             if data.startswith('IMTBuffer'):
                 logger.info("Detected IMTBuffer format")
                 try:
-                    # Extract the hex data after the colon
-                    buffer_parts = data.split(': ')
-                    if len(buffer_parts) != 2:
+                    # Extract the hex data after the colon without splitting
+                    # the whole payload; bytes.fromhex skips surrounding whitespace
+                    separator_index = data.find(': ')
+                    if separator_index == -1:
                         raise ValueError("Invalid IMTBuffer format: missing data part")
                         
-                    hex_data = buffer_parts[1].strip()
-                    logger.info(f"Extracted hex data: {hex_data}")
+                    hex_data = data[separator_index + 2:]
+                    logger.info("Extracted hex data", hex_len=len(hex_data))
                     
-                    # Convert hex to bytes
+                    # Decode hex and parse in one step; orjson validates UTF-8
+                    # on the raw bytes, so no intermediate str copy is made
                     try:
-                        binary_data = bytes.fromhex(hex_data)
-                        logger.info(f"Converted to binary data: {binary_data}")
+                        data = orjson.loads(bytes.fromhex(hex_data))
+                        logger.info("Parsed JSON data", data_type=type(data).__name__)
+                    except orjson.JSONDecodeError as e:
+                        logger.error("Error parsing JSON", error=str(e))
+                        raise ValueError(f"Invalid JSON data: {str(e)}")
                     except ValueError as e:
-                        logger.error(f"Error converting hex to bytes: {str(e)}")
+                        logger.error("Error converting hex to bytes", error=str(e))
                         raise ValueError(f"Invalid hex data: {str(e)}")
-                    
-                    # Decode bytes to string
-                    try:
-                        decoded_data = binary_data.decode('utf-8')
-                        logger.info(f"Decoded data: {decoded_data}")
-                    except UnicodeDecodeError as e:
-                        logger.error(f"Error decoding bytes: {str(e)}")
-                        raise ValueError(f"Invalid UTF-8 data: {str(e)}")
-                    
-                    # Parse JSON
-                    try:
-                        data = json.loads(decoded_data)
-                        logger.info(f"Parsed JSON data: {data}")
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Error parsing JSON: {str(e)}")
-                        raise ValueError(f"Invalid JSON data: {str(e)}")
                         
                 except Exception as e:
-                    logger.error(f"Error processing IMTBuffer data: {str(e)}")
+                    logger.error("Error processing IMTBuffer data", error=str(e))
                     raise HTTPException(status_code=400, detail=f"Error processing buffer data: {str(e)}")
             else:
                 # Try to parse as regular JSON
                 try:
-                    data = json.loads(data)
-                    logger.info(f"Parsed JSON data: {data}")
-                except json.JSONDecodeError as e:
-                    logger.error(f"Error parsing JSON string: {str(e)}")
+                    data = orjson.loads(data)
+                    logger.info("Parsed JSON data", data_type=type(data).__name__)
+                except orjson.JSONDecodeError as e:
+                    logger.error("Error parsing JSON string", error=str(e))
                     raise HTTPException(status_code=400, detail=f"Invalid JSON data: {str(e)}")
 
         # Basic structure validation
         if not isinstance(data, dict):
-            logger.error(f"Data is not a dictionary. Type: {type(data)}")
+            logger.error("Data is not a dictionary", data_type=type(data).__name__)
             raise HTTPException(status_code=400, detail="Expected data to be a dictionary")
             
         if not data:
@@ -109,7 +320,7 @@ async def transform_property_data(data: Dict[str, Any] = Body(...)):
                 raise HTTPException(status_code=400, detail="'results' key not found in data")
 
             if not isinstance(results, dict):
-                logger.error(f"'results' is not a dictionary. Type: {type(results)}")
+                logger.error("'results' is not a dictionary", data_type=type(results).__name__)
                 raise HTTPException(status_code=400, detail="'results' must be a dictionary")
 
             properties_list = results.get('properties')
@@ -118,88 +329,41 @@ async def transform_property_data(data: Dict[str, Any] = Body(...)):
                 raise HTTPException(status_code=400, detail="'properties' key not found in results")
 
             if not isinstance(properties_list, list):
-                logger.error(f"'properties' is not a list. Type: {type(properties_list)}")
+                logger.error("'properties' is not a list", data_type=type(properties_list).__name__)
                 raise HTTPException(status_code=400, detail="'properties' must be a list")
 
-            extracted_properties = []
-            logger.info(f"Processing {len(properties_list)} properties")
-
-            for property_data in properties_list:
-                try:
-                    logger.debug(f"Processing property: {property_data.get('property_id')}")
-                    # --- Basic Property Info ---
-                    prop_info = {
-                        "property_id": property_data.get('property_id'),
-                        "address": property_data.get('property_address_full'),
-                        "address_street": property_data.get('property_address'),
-                        "address_street2": property_data.get('property_address2'),
-                        "address_city": property_data.get('property_address_city'),
-                        "address_state": property_data.get('property_address_state'),
-                        "address_zip": property_data.get('property_address_zip'),
-                        "address_range": property_data.get('property_address_range'),
-                        "owner_name": property_data.get('owner_name'),
-                        "first_contact_name": None,
-                        "bedrooms": property_data.get('total_bedrooms'),
-                        "baths": property_data.get('total_baths'),
-                        "sqft": property_data.get('building_square_feet'),
-                        "estimated_value": property_data.get('EstimatedValue'),
-                        "equity_percent": property_data.get('equity_percent'),
-                        "last_sale_date": property_data.get('sale_date'),
-                        "last_sale_price": property_data.get('saleprice'),
-                        "flags": [flag.get('label') for flag in property_data.get('property_flags', []) if flag and isinstance(flag, dict) and flag.get('label')],
-                    }
-
-                    # --- Process Phone Numbers and Find First Contact Name ---
-                    unique_phones_for_property = set()
-                    first_contact_found = False
-
-                    phone_numbers_list = property_data.get('phone_numbers', [])
-                    if isinstance(phone_numbers_list, list):
-                        logger.debug(f"Processing {len(phone_numbers_list)} phone numbers for property {property_data.get('property_id')}")
-                        for phone_entry in phone_numbers_list:
-                            if not isinstance(phone_entry, dict):
-                                logger.warning(f"Skipping invalid phone entry: {phone_entry}")
-                                continue
-                                
-                            contact_data = phone_entry.get('contact')
-                            if contact_data and isinstance(contact_data, dict):
-                                if not first_contact_found:
-                                    full_name = contact_data.get('full_name')
-                                    if full_name:
-                                        prop_info["first_contact_name"] = full_name
-                                        first_contact_found = True
-                                        logger.debug(f"Found first contact name: {full_name}")
-
-                                for phone in [contact_data.get('phone_1'), contact_data.get('phone_2'), contact_data.get('phone_3')]:
-                                    if phone:
-                                        unique_phones_for_property.add(phone)
-
-                    sorted_unique_phones = sorted(list(unique_phones_for_property))
-                    logger.debug(f"Found {len(sorted_unique_phones)} unique phone numbers for property {property_data.get('property_id')}")
-                    
-                    for i, phone in enumerate(sorted_unique_phones):
-                        prop_info[f'phone_{i}'] = phone
-
-                    extracted_properties.append(prop_info)
-                except Exception as prop_error:
-                    logger.error(f"Error processing property {property_data.get('property_id')}: {str(prop_error)}", exc_info=True)
-                    continue  # Skip this property and continue with others
+            logger.info("Processing properties", count=len(properties_list))
+            extracted_properties = transform_properties(properties_list)
 
-            logger.info(f"Successfully processed {len(extracted_properties)} properties")
-            return extracted_properties
+            logger.info("Successfully processed properties", count=len(extracted_properties))
+            # Return pre-encoded bytes so FastAPI skips jsonable_encoder
+            # The body depends on Accept, so shared caches must key on it
+            headers = {"Vary": "Accept"}
+            if _accepts_msgpack(request.headers.get("accept", "")):
+                return Response(content=ormsgpack.packb(extracted_properties), media_type="application/msgpack", headers=headers)
+            return Response(content=orjson.dumps(extracted_properties), media_type="application/json", headers=headers)
 
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error processing data structure: {str(e)}", exc_info=True)
+            logger.error("Error processing data structure", error=str(e), exc_info=True)
             raise HTTPException(status_code=400, detail=f"Error processing data structure: {str(e)}")
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        logger.error("Unexpected error", error=str(e), exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    uvicorn.run(
+        "api:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        # "auto" selects uvloop/httptools when installed (uvloop has no Windows build)
+        loop="auto",
+        http="auto",
+        log_level=_LOG_LEVEL
+    ) 
\ No newline at end of file
@@ -0,0 +1,13 @@
+import multiprocessing
+import os
+
+# Gunicorn settings for running the API in production
+bind = "0.0.0.0:8000"
+worker_class = "uvicorn_worker.UvicornWorker"
+# cpu_count() reports the host's cores inside a container, so set
+# WEB_CONCURRENCY to match the container's CPU limit
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# Follow the API's LOG_LEVEL setting, falling back to warning like the API
+loglevel = os.environ.get("LOG_LEVEL", "warning").lower()
+if loglevel not in ("debug", "info", "warning", "error", "critical"):
+    loglevel = "warning"
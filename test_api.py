@@ -1,20 +1,22 @@
+import sys
 import requests
-import json
+import orjson
 
 # Load data from data.json
-with open('data.json', 'r') as f:
-    test_data = json.load(f)
+with open('data.json', 'rb') as f:
+    test_data = f.read()
 
 # Make the request
 response = requests.post(
     "http://localhost:8000/transform",
-    json=test_data,
+    data=test_data,
     headers={"Content-Type": "application/json"}
 )
 
 # Print the response
 print("Status Code:", response.status_code)
-print("Response:")
-print(json.dumps(response.json(), indent=2)) 
-with open('response.json', 'w') as f:
-    json.dump(response.json(), f, indent=2)
+print("Response:", flush=True)
+out = orjson.dumps(orjson.loads(response.content), option=orjson.OPT_INDENT_2)
+sys.stdout.buffer.write(out + b"\n")
+with open('response.json', 'wb') as f:
+    f.write(out)